@@ -7,24 +7,67 @@
 # ------------------------------------------------------------
 
 from dash import Dash, dcc, html, Input, Output, State, callback, no_update
-import plotly.express as px
+import plotly.io as pio
+import numpy as np
 import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import os
+import tempfile
 from pathlib import Path
 from functools import lru_cache
 
-# Plotly defaults for a consistent, clean look across figures
-px.defaults.template = "plotly_white"
-px.defaults.height = 420
+@lru_cache(maxsize=1)  # Imported on the first figure callback, not at startup
+def _plotly_express():
+    """
+    Plotly Express, imported lazily (it pulls in a lot that workers only serving
+    the layout never need) with the app's defaults applied once.
+    """
+    import plotly.express as px
+
+    # Plotly defaults for a consistent, clean look across figures
+    px.defaults.template = "plotly_white"
+    px.defaults.height = 420
+    return px
+
+# Same look for figures built as plain dicts (px applies its defaults itself; a raw
+# dict needs the template object, since Plotly.js doesn't know template names)
+_BASE_LAYOUT = {"template": pio.templates["plotly_white"].to_plotly_json(), "height": 420}
+
+# Layout polish applied to every figure
+_LAYOUT_POLISH = {
+    "margin": {"l": 40, "r": 16, "t": 60, "b": 40},
+    "legend": {"title": {"text": ""}},
+    "hoverlabel": {"namelength": -1},  # don't truncate hover labels
+}
 
 # Directory where we expect the Kaggle CSV to live (e.g., ./data/spotify_data.csv)
 DATA_DIR = Path(__file__).parent / "data"
 
+# Bump when the cleaning below changes, so an existing ./data/_cache_*.feather
+# (cleaned DataFrame from a previous run) is ignored instead of loaded stale.
+CACHE_VERSION = 3
+
+# Explicit column types for the Kaggle schema, so the CSV reader never has to
+# infer them. Year is parsed as float (some exports write "2012.0") and cast
+# to int after filtering.
+_CSV_SCHEMA = {
+    "artist_name": pl.String, "track_name": pl.String, "year": pl.Float64,
+    "popularity": pl.Float64, "danceability": pl.Float64, "energy": pl.Float64,
+    "valence": pl.Float64, "tempo": pl.Float64, "acousticness": pl.Float64,
+    "speechiness": pl.Float64, "instrumentalness": pl.Float64,
+    "liveness": pl.Float64, "loudness": pl.Float64,
+}
+
 # ---------- Data ----------
 @lru_cache(maxsize=1)  # Cache the loaded DataFrame once per process run
 def load_spotify() -> pd.DataFrame:
     """
     Find a Spotify CSV in ./data (supports .csv or .csv.gz), load it into a DataFrame,
     perform light cleaning, verify required columns, and return the cleaned DataFrame.
+    The cleaned DataFrame is cached next to the CSV (Feather) and reused on later
+    starts as long as the CSV (name, size, mtime) is unchanged.
 
     Returns:
         pd.DataFrame: Cleaned Spotify dataset.
@@ -42,36 +85,116 @@ def load_spotify() -> pd.DataFrame:
     )
     if not candidates:
         raise FileNotFoundError("Put your Kaggle CSV in /data (e.g., data/spotify_data.csv)")
-
-    # compression="infer" lets pandas detect .gz automatically
-    df = pd.read_csv(candidates[0], low_memory=False, compression="infer")
-    print("Loaded:", candidates[0])
+    source = candidates[0]
+
+    # Reuse the cleaned result of a previous run of this exact CSV. The cache name
+    # records the source's full file name, size and mtime, so a different file
+    # (e.g. spotify_data.csv next to spotify_data.csv.gz) or an edited or replaced
+    # one never matches a stale cache. Arrow IPC loads in a fraction of the time
+    # it takes to parse the CSV.
+    stat = source.stat()
+    cache_prefix = f"_cache_{source.name}_"
+    cache = DATA_DIR / f"{cache_prefix}{stat.st_size}_{stat.st_mtime_ns}_v{CACHE_VERSION}.feather"
+    if cache.exists():
+        try:
+            df = pd.read_feather(cache, use_threads=True)
+            # Feather restores the category but not its Arrow-backed string categories
+            categories = df["artist_name"].cat.categories
+            df["artist_name"] = df["artist_name"].cat.rename_categories(categories.astype("string[pyarrow]"))
+        except (OSError, ValueError, KeyError, AttributeError) as exc:
+            # Unreadable cache (truncated, corrupt, foreign schema): ignore it and
+            # re-parse the CSV below, which rewrites it
+            print("Ignoring unreadable cache", cache, "-", exc)
+        else:
+            print("Loaded:", cache)
+            return df
+
+    # Lazy scan: nothing is read until .collect(), so the projection (select) and
+    # predicates (year range, null drop) below are pushed down into the CSV reader
+    # and run as one optimized pass. Polars detects .gz automatically.
+    # Types come from _CSV_SCHEMA instead of inference; values that don't parse
+    # (e.g. text in a numeric column) become null and are dropped below where needed.
+    lf = pl.scan_csv(
+        source, low_memory=True,
+        infer_schema=False, schema_overrides=_CSV_SCHEMA, ignore_errors=True,
+    )
+    print("Loaded:", source)
 
     # Columns we need for the app to work
     needed = ["artist_name", "track_name", "year", "danceability", "energy", "valence", "tempo"]
-    missing = [c for c in needed if c not in df.columns]
+    columns = lf.collect_schema().names()
+    missing = [c for c in needed if c not in columns]
     if missing:
         raise ValueError(f"Missing columns: {missing}. Check your CSV.")
 
-    # ---- Light cleanup ----
-    # Normalize text columns (strip spaces, ensure str)
-    df["artist_name"] = df["artist_name"].astype(str).str.strip()
-    df["track_name"] = df["track_name"].astype(str).str.strip()
-
-    # Coerce numeric columns; non-numeric values become NaN (then we drop where needed)
-    for c in ["year", "popularity", "danceability", "energy", "valence", "tempo",
-              "acousticness", "speechiness", "instrumentalness", "liveness", "loudness"]:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    # Keep reasonable year range (avoids weird outliers)
-    df = df[df["year"].between(1950, 2030)]
-
-    # Drop rows missing the essentials used in visuals/filters
-    df = df.dropna(subset=["artist_name", "track_name", "year", "danceability", "energy", "valence", "tempo"])
+    # Optional metrics are kept when present; everything else is never materialized
+    optional = ["popularity", "acousticness", "speechiness", "instrumentalness", "liveness", "loudness"]
+    optional_present = [c for c in optional if c in columns]
+    float_cols = [c for c in needed + optional_present
+                  if c not in ("artist_name", "track_name", "year", "popularity")]
+    int8_cols = ["popularity"] if "popularity" in optional_present else []
 
-    # Year should be integer (helps with sliders/labels)
-    df["year"] = df["year"].astype(int)
+    # ---- Light cleanup ----
+    lf = (
+        lf.select([pl.col(c) for c in needed + optional_present])
+        # One fused validity predicate, placed before any column is rewritten so the
+        # whole of it is pushed into the CSV scan (rows are rejected while parsing):
+        # keep reasonable year range (avoids weird outliers) and drop rows missing
+        # the essentials used in visuals/filters
+        .filter(pl.col("year").is_between(1950, 2030) & pl.all_horizontal(pl.col(needed).is_not_null()))
+        # Normalize text columns (strip spaces)
+        .with_columns(
+            pl.col("artist_name").str.strip_chars(),
+            pl.col("track_name").str.strip_chars(),
+        )
+        # Year should be integer (helps with sliders/labels). Everything else is
+        # downcast too: audio features fit float32 and popularity is 0–100, which
+        # halves the memory every mask/groupby/mean has to stream through.
+        .with_columns(
+            pl.col("year").cast(pl.Int16),
+            *[pl.col(c).cast(pl.Float32) for c in float_cols],
+            *[pl.col(c).cast(pl.Int8, strict=False) for c in int8_cols],
+        )
+        # Rows ordered by year (stable), so a year range is one contiguous slice
+        .sort("year", maintain_order=True)
+    )
+    df = lf.collect(engine="streaming").to_pandas()
+
+    # Text columns are Arrow-backed strings rather than Python objects, so string
+    # ops, hashing and value_counts run in Arrow's C++ kernels.
+    # Artist filters are equality checks: as a category they compare small integer
+    # codes instead of strings (its categories stay Arrow-backed too). Song search
+    # matches on a pre-lowered copy of the title so callbacks don't re-lowercase
+    # ~1M strings on every keystroke.
+    df["track_name"] = df["track_name"].astype("string[pyarrow]")
+    df["artist_name"] = df["artist_name"].astype("string[pyarrow]").astype("category")
+    df["_track_lower"] = df["track_name"].str.lower()
+
+    # Write the cache for next start (best effort: the data folder may be read-only).
+    # Uncompressed, single record batch: reads back as contiguous (unchunked) columns.
+    # Written to a temp file and renamed into place, so a crash, a full disk or
+    # another worker starting at the same time never sees a partial cache.
+    df = df.reset_index(drop=True)
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=DATA_DIR, prefix=cache.name, suffix=".tmp", delete=False) as f:
+            tmp = Path(f.name)
+        df.to_feather(tmp, compression="uncompressed", chunksize=len(df))
+        # NamedTemporaryFile creates the file as 0600; give the cache the mode a
+        # plain write would have, so workers running as other users can read it
+        umask = os.umask(0)
+        os.umask(umask)
+        tmp.chmod(0o666 & ~umask)
+        os.replace(tmp, cache)
+    except (OSError, ValueError) as exc:
+        print("Could not write cache:", exc)
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+    else:
+        # Drop caches of earlier versions of this CSV; they can never match again
+        for stale in DATA_DIR.glob(f"{cache_prefix}*.feather"):
+            if stale != cache:
+                stale.unlink(missing_ok=True)
     return df
 
 # Load once 
@@ -92,6 +215,9 @@ _label_map = {
     "loudness":"Loudness (dB)", "popularity":"Popularity"
 }
 
+# Metrics on a 0–1 scale; their trend y-axis is fixed to that range for interpretability
+NORM_METRICS = {"danceability","energy","valence","acousticness","speechiness","instrumentalness","liveness"}
+
 # Build RadioItems options for the Metric picker
 metric_options = [{"label": _label_map.get(m, m.title()), "value": m} for m in _available_metrics]
 
@@ -102,25 +228,301 @@ default_metric = "danceability" if "danceability" in _available_metrics else _av
 years = df["year"]
 year_min, year_max = int(years.min()), int(years.max())
 
+# df is sorted by year: rows of year y are YEAR_START[y - year_min]:YEAR_START[y - year_min + 1]
+YEAR_START = np.searchsorted(years.to_numpy(), np.arange(year_min, year_max + 2))
+
+# Mean of every metric per year, overall and per artist, computed once at startup.
+# The trend chart slices these instead of re-grouping the filtered rows; only a
+# song search (which can't be precomputed) falls back to a groupby per callback.
+YEAR_AGG = df.groupby("year")[_available_metrics].mean()
+
+# Per-artist means are stored as flat arrays grouped by artist code (sorted by code,
+# then year): artist c's years are rows ARTIST_START[c]:ARTIST_START[c + 1]. A trend
+# lookup is then two slices, with no MultiIndex lookup or DataFrame in between.
+_artist_year = df.groupby([df["artist_name"].cat.codes.rename("code"), "year"])[_available_metrics].mean()
+ARTIST_YEARS = _artist_year.index.get_level_values("year").to_numpy()
+ARTIST_MEANS = {m: _artist_year[m].to_numpy() for m in _available_metrics}
+ARTIST_START = np.searchsorted(_artist_year.index.get_level_values("code").to_numpy(),
+                               np.arange(len(df["artist_name"].cat.categories) + 1))
+del _artist_year
+
 # ---------- Helpers ----------
-def filter_data(dfin, artist, years_range, query_text):
+def _dict_figure(traces, title, **layout):
     """
-    Apply all filters to the DataFrame (year range, optional artist, optional track name query).
-    Returns a copy filtered to the current UI selections.
+    Plain-dict figure (no Plotly Express / graph_objects validation) with the
+    app's template, height and layout polish. Dash accepts these as-is.
     """
-    lo, hi = years_range
-    out = dfin[(dfin["year"] >= lo) & (dfin["year"] <= hi)].copy()
+    return {"data": traces, "layout": {**_BASE_LAYOUT, **_LAYOUT_POLISH, "title": {"text": title}, **layout}}
+
+def normalize_query(query_text):
+    """
+    Normalize the song search box value (strip + lowercase) so equivalent inputs
+    share cache entries. Returns None when there is nothing to search for.
+    Lowercased with Arrow's kernel, the one `_track_lower` was built with: Python's
+    str.lower() maps some characters differently (e.g. "İ" -> "i̇" vs "i").
+    """
+    query_text = (query_text or "").strip()
+    return pc.utf8_lower(pa.scalar(query_text)).as_py() if query_text else None
+
+# Titles per block while building the trigram index: keeps the build's temporaries
+# to a few tens of MB no matter how large the dataset is
+_TRIGRAM_BLOCK_ROWS = 32_768
+
+def _block_trigrams(offsets, data, lo, hi):
+    """
+    Distinct (trigram, row) pairs of titles lo:hi, sorted by trigram then row, as
+    (uint32 keys, int32 rows). A trigram key is its 3 bytes packed into 24 bits.
+    """
+    off = offsets[lo:hi + 1]
+    n_grams = np.maximum(np.diff(off) - 2, 0)
+    # Trigram starting at every byte of the block's text; the ones that cross a
+    # title boundary are never selected below
+    text = data[off[0]:off[-1]].astype(np.uint32)
+    grams = (text[:-2] << 16) | (text[1:-1] << 8) | text[2:]
+    del text
+    # Start byte (relative to the block) of every in-title trigram
+    pos = np.arange(int(n_grams.sum()), dtype=np.int64)
+    pos += np.repeat(off[:-1] - off[0] - (np.cumsum(n_grams) - n_grams), n_grams)
+
+    # Pack (key, row) into one uint64 so a single sort orders by trigram, then row
+    pairs = grams[pos].astype(np.uint64)
+    del grams, pos
+    pairs <<= 32
+    pairs |= np.repeat(np.arange(lo, hi, dtype=np.uint64), n_grams)
+    pairs.sort()
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]  # repeats within one title
+    return (pairs >> 32).astype(np.uint32), (pairs & 0xFFFFFFFF).astype(np.int32)
+
+def _group_starts(sorted_keys):
+    """Start positions of each run of equal values in a sorted array, plus the end."""
+    return np.append(np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]), len(sorted_keys))
+
+@lru_cache(maxsize=1)  # Built on the first long-enough search, then kept for the process
+def _trigram_index():
+    """
+    Inverted index from byte trigrams of the lowercased titles to the rows containing
+    them. Stored CSR-style as (keys, starts, rows): the postings of keys[i] are
+    rows[starts[i]:starts[i + 1]], sorted ascending. Byte (UTF-8) trigrams are fine
+    for substring search since a substring's bytes are a substring of the title's bytes.
+
+    Built in two passes over fixed-size blocks of titles (count, then fill), so apart
+    from the final int32 postings only one block's temporaries are alive at a time.
+    """
+    titles = pa.array(df["_track_lower"]).cast(pa.large_string())
+    if isinstance(titles, pa.ChunkedArray):
+        titles = titles.combine_chunks()
+    offsets = np.frombuffer(titles.buffers()[1], dtype=np.int64)[titles.offset:titles.offset + len(titles) + 1]
+    data = np.frombuffer(titles.buffers()[2], dtype=np.uint8)
+    blocks = [(lo, min(lo + _TRIGRAM_BLOCK_ROWS, len(titles))) for lo in range(0, len(titles), _TRIGRAM_BLOCK_ROWS)]
+
+    # Pass 1: distinct trigrams and how many titles contain each
+    block_keys, block_counts = [], []
+    for lo, hi in blocks:
+        keys, _ = _block_trigrams(offsets, data, lo, hi)
+        bounds = _group_starts(keys)
+        block_keys.append(keys[bounds[:-1]])
+        block_counts.append(np.diff(bounds))
+    all_keys = np.concatenate(block_keys)
+    order = np.argsort(all_keys, kind="stable")
+    all_keys = all_keys[order]
+    bounds = _group_starts(all_keys)
+    keys = all_keys[bounds[:-1]]
+    counts = np.add.reduceat(np.concatenate(block_counts)[order], bounds[:-1])
+    starts = np.append(0, np.cumsum(counts))
+    del block_keys, block_counts, all_keys, order
+
+    # Pass 2: write each block's rows after the ones already placed for the same
+    # trigram; blocks go in row order, so every posting list ends up sorted
+    rows = np.empty(starts[-1], dtype=np.int32)
+    cursor = starts[:-1].copy()
+    for lo, hi in blocks:
+        block_key, block_rows = _block_trigrams(offsets, data, lo, hi)
+        bounds = _group_starts(block_key)
+        n = np.diff(bounds)
+        slot = np.searchsorted(keys, block_key[bounds[:-1]])  # one lookup per distinct trigram
+        rank = np.arange(len(block_key)) - np.repeat(bounds[:-1], n)
+        rows[np.repeat(cursor[slot], n) + rank] = block_rows
+        cursor[slot] += n
+    return keys, starts, rows
+
+def search_tracks(qt):
+    """
+    Sorted positional indices of the rows whose lowercased title contains `qt`
+    (already normalized, at least 3 bytes long), via the trigram index.
+    """
+    needle = qt.encode("utf-8")
+    keys, starts, rows = _trigram_index()
+    grams = np.unique([(needle[i] << 16) | (needle[i + 1] << 8) | needle[i + 2]
+                       for i in range(len(needle) - 2)])
+    at = np.searchsorted(keys, grams)
+    if (at >= len(keys)).any() or (keys[np.minimum(at, len(keys) - 1)] != grams).any():
+        return np.empty(0, dtype=np.int32)  # some trigram never occurs
+
+    # Intersect the posting lists, shortest first so the candidate set shrinks fastest
+    postings = sorted((rows[starts[i]:starts[i + 1]] for i in at), key=len)
+    cand = postings[0]
+    for p in postings[1:]:
+        cand = np.intersect1d(cand, p, assume_unique=True)
+
+    # Every trigram matching doesn't imply the substring matches; verify the survivors
+    titles = pa.array(df["_track_lower"].iloc[cand])
+    return cand[pc.match_substring(titles, qt).to_numpy(zero_copy_only=False)]
+
+def artist_trend(artist, metric, lo, hi):
+    """
+    (years, means) of `metric` for `artist` within [lo, hi], sliced from the
+    precomputed per-artist arrays. Empty arrays if the artist is unknown.
+    """
+    code = df["artist_name"].cat.categories.get_indexer([artist])[0]
+    if code < 0:
+        return ARTIST_YEARS[:0], ARTIST_MEANS[metric][:0]
+    start, stop = ARTIST_START[code], ARTIST_START[code + 1]
+    years_of_artist = ARTIST_YEARS[start:stop]
+    i = start + np.searchsorted(years_of_artist, lo)
+    j = start + np.searchsorted(years_of_artist, hi, side="right")
+    return ARTIST_YEARS[i:j], ARTIST_MEANS[metric][i:j]
+
+def _narrow(rows, mask):
+    """Keep the positions in `rows` (a slice or index array) where `mask` is True."""
+    if isinstance(rows, slice):
+        return np.flatnonzero(mask) + (rows.start or 0)
+    return rows[mask]
+
+# Dash fires both callbacks per control change; share the scans. Entries can be
+# index arrays of up to ~4 MB each (a one-letter query over every year), so keep
+# only the last few states rather than a slider sweep's worth.
+@lru_cache(maxsize=8)
+def _filter_idx(artist, lo, hi, qt):
+    """
+    Rows of `df` matching the filters (year range, optional artist, optional
+    normalized track name query), as an `.iloc` selector: a slice when only the
+    year range filters, else a read-only int32 array.
+    """
+    # df is sorted by year, so the year range is a contiguous slice: no mask, no copy
+    # (clamped to the data's years, so an out-of-domain range is just empty)
+    start, stop = YEAR_START[np.clip([lo, hi + 1], year_min, year_max + 1) - year_min]
+    rows = slice(int(start), int(max(start, stop)))
 
     # Filter to selected artist (if any)
     if artist:
-        out = out[out["artist_name"] == artist]
+        rows = _narrow(rows, (df["artist_name"].iloc[rows] == artist).to_numpy())
+
+    # Text search on track_name (case-insensitive contains). Without an artist the
+    # candidate set is large, so queries of 3+ bytes go through the trigram index;
+    # otherwise one Arrow substring kernel over the pre-lowered titles.
+    if qt and not artist and len(qt.encode("utf-8")) >= 3:
+        hits = search_tracks(qt)  # rows is still the year-range slice here
+        rows = hits[np.searchsorted(hits, rows.start):np.searchsorted(hits, rows.stop)]
+    elif qt:
+        titles = pa.array(df["_track_lower"].iloc[rows])
+        rows = _narrow(rows, pc.match_substring(titles, qt).to_numpy(zero_copy_only=False))
+
+    if isinstance(rows, np.ndarray):
+        rows = rows.astype(np.int32)
+        rows.flags.writeable = False  # shared between callers via the cache
+    return rows
+
+def filter_data(artist, years_range, query_text):
+    """
+    Apply all filters to the DataFrame (year range, optional artist, optional track name query).
+    Returns the rows of `df` matching the current UI selections (read-only; not a copy).
+    """
+    lo, hi = years_range
+    return df.iloc[_filter_idx(artist or None, int(lo), int(hi), normalize_query(query_text))]
+
+@lru_cache(maxsize=256)  # nudging the slider back to a previous state is a cache hit
+def _artist_options(lo, hi, qt):
+    """
+    Artists in the year range matching the (normalized) track name query, most
+    frequent first, capped to 300 to keep the dropdown responsive. Returns a tuple.
+    """
+    # Rows in the year range matching the track name search (if provided)
+    rows = _filter_idx(None, lo, hi, qt)
+
+    # Rank artists by frequency within the current filtered set
+    # (a categorical value_counts also lists unused categories, so drop the zeros)
+    counts = df["artist_name"].iloc[rows].value_counts()
+    counts = counts[counts > 0]
+    return tuple(counts.head(300).index.tolist())
+
+# ---------- Figures ----------
+
+def _build_trend(dff, metric, artist, years_range, query_text):
+    """Trend over time: mean of `metric` per year for the current filters."""
+    lo, hi = years_range
+    if normalize_query(query_text):
+        trend = dff.groupby("year")[metric].mean().loc[lo:hi]
+        trend_years, trend_values = trend.index.to_numpy(), trend.to_numpy()
+    elif artist:
+        trend_years, trend_values = artist_trend(artist, metric, lo, hi)
+    else:
+        trend = YEAR_AGG[metric].loc[lo:hi]
+        trend_years, trend_values = trend.index.to_numpy(), trend.to_numpy()
+
+    # Built as a plain figure dict: for a few dozen points, Plotly Express'
+    # DataFrame handling and validation cost more than the chart itself
+    if not len(trend_years):
+        return _dict_figure([], title="No data for current filters")  # Empty-state figure
+    label = _label_map.get(metric, metric.title())
+    return _dict_figure(
+        [{
+            "type": "scatter", "mode": "lines+markers",
+            "x": trend_years.tolist(), "y": trend_values.tolist(),
+            "hovertemplate": f"year=%{{x}}<br>{metric}=%{{y}}<extra></extra>",
+        }],
+        title=f"{label} Trend {years_range[0]}–{years_range[1]}" + (f" — {artist}" if artist else ""),
+        xaxis={"title": {"text": "Year"}},
+        yaxis={"title": {"text": label}, **({"range": [0, 1]} if metric in NORM_METRICS else {})},
+    )
+
+def _build_scatter(dff, artist, years_range):
+    """Energy vs Tempo scatter (bubble size = popularity if present)."""
+    px = _plotly_express()
+
+    # Only keep rows with required columns present
+    dff_scatter = dff[["track_name","artist_name","year","energy","tempo","popularity"]].dropna()
+    # Thin to at most 5000 points with a fixed stride: one sequential pass, and the
+    # plot stays stable across filter changes (unlike a random sample)
+    if len(dff_scatter) > 5000:
+        step = len(dff_scatter) // 5000 + 1
+        dff_scatter = dff_scatter.iloc[::step]
+    if len(dff_scatter):
+        fig = px.scatter(
+            dff_scatter, x="tempo", y="energy",
+            render_mode="webgl",  # GPU-rendered scattergl, even below px's auto-switch threshold
+            hover_data=["track_name","artist_name","year","popularity"],
+            size="popularity" if "popularity" in dff_scatter.columns else None,
+            title="Energy vs Tempo"
+                  + (f" — {artist}" if artist else "")
+                  + f" ({years_range[0]}–{years_range[1]})"
+        )
+        fig.update_layout(xaxis_title="Tempo (BPM)", yaxis_title="Energy", hovermode="closest")
+        fig.update_yaxes(range=[0, 1])  # Energy is 0–1
+    else:
+        fig = px.scatter(title="No data for current filters")
+    return fig.update_layout(**_LAYOUT_POLISH)
 
-    # Text search on track_name (case-insensitive contains)
-    if query_text:
-        qt = query_text.strip().lower()
-        if qt:
-            out = out[out["track_name"].str.lower().str.contains(qt)]
-    return out
+def _build_bar(dff, metric, artist):
+    """Top tracks bar chart ranked by popularity (fallback to chosen metric)."""
+    px = _plotly_express()
+
+    # Prefer to rank by popularity if available; else fallback to chosen metric
+    rank_metric = "popularity" if "popularity" in dff.columns else metric
+    # nlargest does a partial selection instead of sorting every filtered row
+    top = dff.nlargest(15, rank_metric, keep="first")[["track_name","artist_name",rank_metric]]
+    if len(top):
+        # Reverse order so the highest bar appears at the top (typical horizontal bar style)
+        fig = px.bar(
+            top.iloc[::-1], x=rank_metric, y="track_name",
+            orientation="h", text=rank_metric,
+            title=f"Top Tracks by {_label_map.get(rank_metric, rank_metric.title())}"
+                  + (f" — {artist}" if artist else "")
+        )
+        fig.update_layout(xaxis_title=_label_map.get(rank_metric, rank_metric.title()), yaxis_title="Track")
+        fig.update_traces(textposition="outside", cliponaxis=False)  # show labels outside bars
+    else:
+        fig = px.bar(title="No top tracks for current filters")
+    return fig.update_layout(**_LAYOUT_POLISH)
 
 # ---------- App ----------
 app = Dash(__name__)
@@ -218,18 +620,11 @@ def update_artist_options(years_range, query_text, current_artist):
     If the currently selected artist is still valid, keep it; else clear selection.
     """
     lo, hi = years_range
-    d = df[(df["year"] >= lo) & (df["year"] <= hi)]
-
-    # Apply track name search filter if provided
-    if query_text and (qt := query_text.strip().lower()):
-        d = d[d["track_name"].str.lower().str.contains(qt)]
-
-    # Rank artists by frequency within the current filtered set
-    counts = d["artist_name"].value_counts()
-    options = [{"label": a, "value": a} for a in counts.head(300).index.tolist()]  # cap to 300 to keep list responsive
+    artists = _artist_options(int(lo), int(hi), normalize_query(query_text))
+    options = [{"label": a, "value": a} for a in artists]
 
     # Keep the current selection only if it's still present in the new options
-    if current_artist and any(opt["value"] == current_artist for opt in options):
+    if current_artist and current_artist in artists:
         return options, current_artist
     return options, None  # otherwise clear selection
 
@@ -250,70 +645,13 @@ def update_figures(artist, metric, years_range, query_text):
       2) Energy vs Tempo scatter (bubble size = popularity if present)
       3) Top tracks bar chart ranked by popularity (fallback to chosen metric)
     """
-    dff = filter_data(df, artist, years_range, query_text)
-
-    # --- 1) Trend over time (mean metric per year) ---
-    if len(dff):
-        trend = dff.groupby("year", as_index=False)[metric].mean().sort_values("year")
-        fig_trend = px.line(
-            trend, x="year", y=metric, markers=True,
-            title=f"{_label_map.get(metric, metric.title())} Trend {years_range[0]}–{years_range[1]}"
-                  + (f" — {artist}" if artist else "")
-        )
-        fig_trend.update_layout(xaxis_title="Year", yaxis_title=_label_map.get(metric, metric.title()))
+    dff = filter_data(artist, years_range, query_text)
 
-        # If metric is a 0–1 feature, fix the y-axis to that range for interpretability
-        if metric in {"danceability","energy","valence","acousticness","speechiness","instrumentalness","liveness"}:
-            fig_trend.update_yaxes(range=[0, 1])
-    else:
-        # Empty-state figure
-        fig_trend = px.scatter(title="No data for current filters")
-
-    # --- 2) Energy vs Tempo scatter ---
-    # Only keep rows with required columns present
-    dff_scatter = dff[["track_name","artist_name","year","energy","tempo","popularity"]].dropna()
-    if len(dff_scatter) > 5000:
-        dff_scatter = dff_scatter.sample(5000, random_state=7)
-    if len(dff_scatter):
-        fig_scatter = px.scatter(
-            dff_scatter, x="tempo", y="energy",
-            hover_data=["track_name","artist_name","year","popularity"],
-            size="popularity" if "popularity" in dff_scatter.columns else None,
-            title="Energy vs Tempo"
-                  + (f" — {artist}" if artist else "")
-                  + f" ({years_range[0]}–{years_range[1]})"
-        )
-        fig_scatter.update_layout(xaxis_title="Tempo (BPM)", yaxis_title="Energy", hovermode="closest")
-        fig_scatter.update_yaxes(range=[0, 1])  # Energy is 0–1
-    else:
-        fig_scatter = px.scatter(title="No data for current filters")
-
-    # --- 3) Top tracks bar chart ---
-    # Prefer to rank by popularity if available; else fallback to chosen metric
-    rank_metric = "popularity" if "popularity" in dff.columns else metric
-    top = dff.sort_values(rank_metric, ascending=False).head(15)[["track_name","artist_name",rank_metric]]
-    if len(top):
-        # Reverse order so the highest bar appears at the top (typical horizontal bar style)
-        fig_bar = px.bar(
-            top.iloc[::-1], x=rank_metric, y="track_name",
-            orientation="h", text=rank_metric,
-            title=f"Top Tracks by {_label_map.get(rank_metric, rank_metric.title())}"
-                  + (f" — {artist}" if artist else "")
-        )
-        fig_bar.update_layout(xaxis_title=_label_map.get(rank_metric, rank_metric.title()), yaxis_title="Track")
-        fig_bar.update_traces(textposition="outside", cliponaxis=False)  # show labels outside bars
-    else:
-        fig_bar = px.bar(title="No top tracks for current filters")
-
-    # Apply consistent layout polish to all figures
-    for fig in (fig_trend, fig_scatter, fig_bar):
-        fig.update_layout(
-            margin=dict(l=40, r=16, t=60, b=40),
-            legend_title_text="",
-            hoverlabel=dict(namelength=-1),  # don't truncate hover labels
-        )
-
-    return fig_trend, fig_scatter, fig_bar
+    return (
+        _build_trend(dff, metric, artist, years_range, query_text),
+        _build_scatter(dff, artist, years_range),
+        _build_bar(dff, metric, artist),
+    )
 
 # ---------- Run ----------
 if __name__ == "__main__":